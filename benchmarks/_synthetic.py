@@ -0,0 +1,62 @@
+"""
+Exports sintéticos de Microsoft Planner para los benchmarks (mismas columnas
+que un export real, valores sucios incluidos: acentos, emoji, mayúsculas,
+vacíos y etiquetas desconocidas). Deterministas por semilla.
+"""
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+PEOPLE  = ["Jose Tellez", "Lizeth Castro", "Viviana Gallego", "Diego Barahona",
+           "Jorge Villarraga", "Ana Ruiz", "Luis Mora"]
+TAGS    = ["🟨 Excelencia ERP", "🟦 Eficiencia Operativa", "Seguridad de la Información",
+           "🟩 Datos Confiables", "Integración", "Finanzas", "Compras", "RRHH", "Logística",
+           "Comercial", "🔴 Urgente", "integracion SAP", "SEGURIDAD DE LA INFORMACIÓN"]
+PROG    = ["Completado", "En curso", "No iniciado", "Completed", "in progress",
+           " Not Started ", None, "Bloqueado"]
+LATE    = [True, False, "true", "Sí", "no", None, 1, 0, "1", "FALSE", "si"]
+BUCKETS = ["Backlog", "En validación", "Desarrollo", "Validacion QA", "Cerrado", None]
+
+
+def planner_export(n: int, seed: int = 0, extra_cols: int = 30,
+                   people: list | None = None) -> pd.DataFrame:
+    """DataFrame con el layout del export de Planner (n tareas)."""
+    r      = random.Random(seed)
+    people = people or PEOPLE
+    base   = datetime(2026, 1, 1)
+    rows   = []
+    for i in range(n):
+        c   = base + timedelta(days=r.randint(0, 300))
+        fin = c + timedelta(days=r.randint(0, 60)) if r.random() < 0.5 else None
+        k   = r.randint(0, 3)
+        row = {
+            "Id. de tarea":          f"T{seed}-{i}",
+            "Nombre de la tarea":    f"Tarea {i}" if r.random() > 0.01 else None,
+            "Nombre del depósito":   r.choice(BUCKETS),
+            "Progreso":              r.choice(PROG),
+            "Prioridad":             r.choice(["Urgente", "Importante", "Media", "Baja"]),
+            "Asignado a":            ";".join(r.sample(people, k)) if k else None,
+            "Creado por":            r.choice(people),
+            "Fecha de creación":     c.strftime("%d/%m/%Y"),
+            "Fecha de inicio":       None,
+            "Fecha de vencimiento":  (c + timedelta(days=r.randint(5, 90))).strftime("%d/%m/%Y"),
+            "Es periódica":          False,
+            "Con retraso":           r.choice(LATE),
+            "Fecha de finalización": fin.strftime("%d/%m/%Y") if fin else None,
+            "Completado por":        None,
+            "Etiquetas":             ";".join(r.sample(TAGS, r.randint(0, 3))) or None,
+            "Descripción":           "Lorem ipsum dolor sit amet " * r.randint(1, 8),
+        }
+        for j in range(extra_cols):
+            row[f"Extra {j}"] = "texto libre " * 3
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def planner_xlsx(n: int, seed: int = 0, **kw) -> bytes:
+    """El mismo export serializado como .xlsx (openpyxl)."""
+    import io
+    buf = io.BytesIO()
+    planner_export(n, seed, **kw).to_excel(buf, index=False)
+    return buf.getvalue()
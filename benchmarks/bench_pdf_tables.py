@@ -0,0 +1,98 @@
+"""
+Benchmark de las tablas del PDF: el armado anterior (un Paragraph por celda,
+Table simple) contra _df_to_table (texto plano salvo celdas que no caben,
+LongTable con cabecera repetida). Usa el anexo de un mes sintético de 30k
+filas; mide el armado de la tabla y el doc.build por separado, y al final el
+informe completo (anexo de _PDF_ANEXO_MAX_ROWS filas).
+
+    python benchmarks/bench_pdf_tables.py [filas del anexo ...]   # por defecto 500 5000
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+N_MES = 30_000
+
+
+def _df_to_table_anterior(app, df, max_rows=20, col_widths=None):
+    """Versión previa de app._df_to_table (referencia, sin cambios de lógica)."""
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Table, TableStyle
+    s = app._get_pdf_styles()
+    df = app.plain_values(df.head(max_rows)).fillna("—")
+
+    header = [Paragraph(str(c), s["header_cell"]) for c in df.columns]
+    rows   = [header]
+    for _, row in df.iterrows():
+        rows.append([Paragraph(str(v), s["body_cell"]) for v in row])
+
+    page_w = app.A4[0] - 3.4*cm
+    if col_widths is None:
+        n = len(df.columns)
+        col_widths = [page_w / n] * n
+
+    tbl = Table(rows, colWidths=col_widths)
+    tbl.setStyle(TableStyle([
+        ("BACKGROUND",    (0,0), (-1,0), app._PDF_DARK),
+        ("TEXTCOLOR",     (0,0), (-1,0), app._PDF_WHITE),
+        ("ALIGN",         (0,0), (-1,-1), "CENTER"),
+        ("VALIGN",        (0,0), (-1,-1), "MIDDLE"),
+        ("GRID",          (0,0), (-1,-1), 0.4, app._PDF_BORDER),
+        ("ROWBACKGROUNDS",(0,1), (-1,-1), [app._PDF_LIGHTGRAY, app._PDF_WHITE]),
+        ("TOPPADDING",    (0,0), (-1,-1), 5),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 5),
+        ("LEFTPADDING",   (0,0), (-1,-1), 6),
+        ("FONTSIZE",      (0,0), (-1,-1), 7.5),
+    ]))
+    return tbl
+
+
+def _build(app, tbl):
+    """doc.build de una sola tabla; retorna (KB, páginas)."""
+    from reportlab.platypus import SimpleDocTemplate
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=app.A4)
+    doc.build([tbl])
+    return buf.getbuffer().nbytes / 1024, doc.page
+
+
+def main(tamanos):
+    import logging
+    import warnings
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings("ignore")
+    import app
+    from _synthetic import planner_export
+
+    raw = planner_export(N_MES, seed=1, extra_cols=0)
+    df, _ = app.preprocess_data(f"bench-{N_MES}", raw)
+    anexo  = app._anexo_df(df)
+    anchos = [w for _, w in app._PDF_ANEXO_COLS.values()]
+    print(f"mes sintético: {len(df):,} filas · anexo {len(anexo):,} filas")
+
+    print(f"{'filas':>6}  {'armado':<22} {'tabla':>8} {'build':>8} {'total':>8} {'págs':>5} {'KB':>6}")
+    for n in tamanos:
+        d = anexo.head(n)
+        for nombre, armar in (
+                ("anterior (Paragraph)", lambda: _df_to_table_anterior(app, d, len(d), anchos)),
+                ("_df_to_table", lambda: app._df_to_table(d, col_widths=anchos))):
+            t   = time.perf_counter()
+            tbl = armar()
+            t1  = time.perf_counter()
+            kb, paginas = _build(app, tbl)
+            t2  = time.perf_counter()
+            print(f"{n:>6}  {nombre:<22} {t1 - t:>7.2f}s {t2 - t1:>7.2f}s {t2 - t:>7.2f}s "
+                  f"{paginas:>5} {kb:>6.0f}")
+
+    t   = time.perf_counter()
+    pdf = app.generate_pdf_report({}, {}, df)
+    print(f"informe completo (anexo {min(len(anexo), app._PDF_ANEXO_MAX_ROWS):,} filas): "
+          f"{time.perf_counter() - t:.2f}s · {len(pdf) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [500, 5000])
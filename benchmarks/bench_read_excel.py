@@ -0,0 +1,89 @@
+"""
+Benchmark de lectura del export: read_planner_excel (streaming + proyección de
+columnas) contra pd.read_excel. Cada lector corre en su propio proceso para
+medir el pico de RSS sin contaminación.
+
+    python benchmarks/bench_read_excel.py [filas ...]     # por defecto 20000 50000
+
+Linux: el pico de RSS se muestrea desde /proc/self/statm.
+"""
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _rss_mb() -> float:
+    """RSS actual del proceso (Linux, /proc/self/statm)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def _medir(lector: str, path: str, repeticiones: int = 3):
+    """
+    Se ejecuta en el subproceso: imprime 'segundos filas columnas pico_MB'.
+    Ambos lectores importan app antes de medir (misma base de memoria); el pico
+    se muestrea cada 5 ms por encima del RSS previo a la lectura. El tiempo es
+    el mejor de `repeticiones`.
+    """
+    import gc
+    import logging
+    import threading
+    logging.disable(logging.CRITICAL)
+    import pandas as pd
+    import app
+    data = open(path, "rb").read()
+    leer = (lambda: app.read_planner_excel(data)) if lector == "app" else (
+        lambda: pd.read_excel(io.BytesIO(data), sheet_name=0))
+
+    tiempos, picos = [], []
+    for _ in range(repeticiones):
+        gc.collect()
+        base, pico, fin = _rss_mb(), [0.0], threading.Event()
+
+        def _muestrear():
+            while not fin.wait(0.005):
+                pico[0] = max(pico[0], _rss_mb())
+
+        hilo = threading.Thread(target=_muestrear)
+        hilo.start()
+        t  = time.perf_counter()
+        df = leer()
+        tiempos.append(time.perf_counter() - t)
+        pico[0] = max(pico[0], _rss_mb())
+        fin.set()
+        hilo.join()
+        picos.append(pico[0] - base)
+        del df
+    df = leer()
+    print(f"{min(tiempos):.3f} {df.shape[0]} {df.shape[1]} {max(picos):.0f}")
+
+
+def main(tamanos):
+    from _synthetic import planner_xlsx
+    print(f"{'filas':>7}  {'lector':<20} {'tiempo':>8} {'pico RSS':>10}  columnas")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in tamanos:
+            path = os.path.join(tmp, f"export_{n}.xlsx")
+            with open(path, "wb") as f:
+                f.write(planner_xlsx(n, seed=n))
+            for lector, nombre in (("pandas", "pd.read_excel"), ("app", "read_planner_excel")):
+                out = subprocess.run([sys.executable, __file__, "--medir", lector, path],
+                                     capture_output=True, text=True, check=True,
+                                     cwd=tmp).stdout.split()
+                dt, filas, cols, peak = float(out[0]), int(out[1]), int(out[2]), float(out[3])
+                assert filas == n, (lector, filas, n)
+                print(f"{n:>7}  {nombre:<20} {dt:>7.2f}s {peak:>8.0f} MB  {cols}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--medir":
+        _medir(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or [20000, 50000])
@@ -0,0 +1,65 @@
+"""
+Benchmark de calculate_workload (agregación única sobre la tabla puente
+tarea × especialista). Mide varios tamaños hasta 500 especialistas × 200k
+asignaciones; si el cálculo escala linealmente, el costo por asignación
+(µs/asig.) se mantiene aproximadamente constante entre tamaños.
+
+    python benchmarks/bench_workload.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TAMANOS = [(500, 25_000), (500, 50_000), (500, 100_000), (500, 200_000)]
+REPETICIONES = 5
+
+
+def caso(n_especialistas: int, n_asignaciones: int, seed: int = 0):
+    """Mes sintético (≈2 asignaciones por tarea) y su tabla puente."""
+    rng     = np.random.default_rng(seed)
+    n_tasks = n_asignaciones // 2
+    df = pd.DataFrame({
+        "progreso":        rng.choice(["Completado", "En curso", "No iniciado"], n_tasks),
+        "retraso":         rng.random(n_tasks) < 0.2,
+        "vencida_abierta": rng.random(n_tasks) < 0.1,
+        "lead_time_dias":  np.where(rng.random(n_tasks) < 0.5,
+                                    rng.integers(0, 60, n_tasks), np.nan),
+    })
+    bridge = pd.DataFrame({
+        "task":         rng.integers(0, n_tasks, n_asignaciones),
+        "especialista": np.array([f"Especialista {i:03d}" for i in range(n_especialistas)],
+                                 dtype=object)[rng.integers(0, n_especialistas, n_asignaciones)],
+    }).drop_duplicates(ignore_index=True)
+    return df, bridge
+
+
+def main():
+    import logging
+    logging.disable(logging.CRITICAL)
+    import app
+
+    print(f"{'espec.':>6} {'asignaciones':>13} {'mejor':>9} {'µs/asig.':>9}")
+    costos = []
+    for n_esp, n_asig in TAMANOS:
+        df, bridge = caso(n_esp, n_asig)
+        tiempos = []
+        for _ in range(REPETICIONES):
+            t  = time.perf_counter()
+            wl = app.calculate_workload(df, bridge)
+            tiempos.append(time.perf_counter() - t)
+        assert len(wl) == bridge["especialista"].nunique()
+        assert wl["Total"].sum() == len(bridge)
+        mejor = min(tiempos)
+        costos.append(mejor / len(bridge) * 1e6)
+        print(f"{n_esp:>6} {len(bridge):>13,} {mejor * 1e3:>7.1f}ms {costos[-1]:>9.2f}")
+    print(f"costo por asignación: máx/mín = {max(costos) / min(costos):.2f} "
+          "(≈1 → lineal; los tamaños chicos pagan el costo fijo de pandas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import logging
+import sys
+from pathlib import Path
+
+# app.py vive en la raíz del repo (no es un paquete instalable)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Importar app fuera de `streamlit run` avisa de "No runtime found" por cada caché
+logging.getLogger("streamlit").setLevel(logging.ERROR)
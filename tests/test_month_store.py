@@ -0,0 +1,52 @@
+"""
+Almacén compartido de meses (3D): un mes expulsado por el LRU que una sesión
+todavía referencia vuelve a servirse como la misma instancia (una sola copia
+por proceso); cuando ninguna sesión lo retiene, se libera.
+"""
+import gc
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture
+def store(monkeypatch):
+    app._month_store.clear()
+    monkeypatch.setattr(app, "_STORE_MAX_BYTES", 1)   # solo cabe el último mes
+    yield app._month_store()
+    app._month_store.clear()
+
+
+def _mes(n: int) -> pd.DataFrame:
+    return pd.DataFrame({"progreso": ["Completado"] * n, "vencimiento": pd.NaT,
+                         "finalizacion": pd.NaT})
+
+
+HOY = date.today().isoformat()
+
+
+def test_expulsado_y_referenciado_no_se_duplica(store):
+    df1, meta1 = app.store_put("a" * 64, _mes(10), {"dia": HOY})
+    app.store_put("b" * 64, _mes(20), {"dia": HOY})
+    assert "a" * 64 not in store["entries"]          # expulsado por el LRU
+
+    # La sesión aún retiene df1/meta1: se recupera la misma instancia
+    df, meta = app.store_get("a" * 64, disk=False)
+    assert df is df1 and meta is meta1
+    assert "a" * 64 in store["entries"]
+
+    # Re-ingerir el mismo archivo tampoco crea otra copia
+    app.store_put("b" * 64, _mes(20), {"dia": HOY})
+    df, meta = app.store_put("a" * 64, _mes(10), {"dia": HOY})
+    assert df is df1 and meta is meta1
+
+
+def test_expulsado_sin_referencias_se_libera(store):
+    app.store_put("a" * 64, _mes(10), {"dia": HOY})
+    app.store_put("b" * 64, _mes(20), {"dia": HOY})
+    gc.collect()
+    assert app.store_get("a" * 64, disk=False) is None
+    assert "a" * 64 not in store["expulsados_df"]
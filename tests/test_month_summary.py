@@ -0,0 +1,82 @@
+"""
+Resúmenes mensuales persistidos (3E): tras un reinicio, la vista de Evolución
+se arma con los escalares del manifiesto y las claves de <sha>.resumen.parquet,
+sin leer el Parquet de ningún mes, y da lo mismo que los resúmenes en memoria.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def _mes(n: int, seed: int) -> pd.DataFrame:
+    """Export de Planner mínimo; los dos cortes comparten parte de las tareas."""
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(n * 2, n, replace=False)
+    return pd.DataFrame({
+        "Id. de tarea":          [f"T{i}" for i in ids],
+        "Nombre de la tarea":    [f"Tarea {i}" for i in ids],
+        "Nombre del depósito":   rng.choice(["Backlog", "Desarrollo"], n),
+        "Progreso":              rng.choice(["Completado", "En curso", "No iniciado"], n),
+        "Asignado a":            rng.choice(["Ana Ruiz", "Luis Mora;Ana Ruiz", None], n),
+        "Fecha de creación":     "01/02/2026",
+        "Fecha de vencimiento":  rng.choice(["01/03/2026", "01/03/2099", None], n),
+        "Con retraso":           rng.random(n) < 0.2,
+        "Fecha de finalización": rng.choice(["15/02/2026", None], n),
+        "Etiquetas":             rng.choice(["🟨 Excelencia ERP", "Integración", None], n),
+    })
+
+
+@pytest.fixture
+def meses(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    app._month_store.clear()
+    out = {}
+    for seed, mes in enumerate(["2026-01", "2026-02"]):
+        digest = f"{seed}" * 64
+        df, meta = app.store_put(digest, *app.preprocess_data(digest, _mes(300, seed)))
+        assert app.persist_month(mes, df, meta)
+        out[mes] = (df, meta)
+    yield out
+    app._month_store.clear()
+
+
+def test_resumen_persistido_igual_al_de_memoria(meses):
+    manifest = app.load_month_manifest()
+    for mes, (df, meta) in meses.items():
+        persistido = app.load_month_summary(manifest[mes])
+        en_memoria = app.summarize_month(df, meta)
+        assert persistido.keys() == en_memoria.keys()
+        for k, v in en_memoria.items():
+            if isinstance(v, np.ndarray):
+                np.testing.assert_array_equal(persistido[k], v)
+                assert persistido[k].dtype == v.dtype
+            else:
+                assert persistido[k] == v, k
+
+    resumenes = [app.load_month_summary(manifest[m]) for m in sorted(meses)]
+    pd.testing.assert_frame_equal(
+        app.lineage_index(resumenes),
+        app.lineage_index([app.summarize_month(*meses[m]) for m in sorted(meses)]))
+
+
+def test_sesion_nueva_no_lee_los_meses(meses, monkeypatch):
+    app._month_store.clear()   # "reinicio": nada en memoria
+
+    def no_leer(*args, **kwargs):
+        raise AssertionError("se leyó el Parquet de un mes")
+
+    monkeypatch.setattr(app, "load_persisted_month", no_leer)
+    sd = {"historial_meta": {}}
+    hist, sd["historial_meta"] = app.session_history(sd)
+    sd["historial_reportes"] = hist
+    for mes in meses:
+        assert hist.summary(mes) is not None
+
+    monkeypatch.setitem(app.st.session_state, "_sd", sd)
+    evo = app.build_evolution_df()
+    assert evo["Clave"].tolist() == sorted(meses)
+    assert evo["Total"].tolist() == [300, 300]
+    assert hist.loaded() == {}
@@ -0,0 +1,180 @@
+"""
+Persistencia compartida entre sesiones: estrés con varios procesos que guardan
+KPIs (bloqueo optimista por kpis_version) y escriben/leen el mismo snapshot a
+la vez, y la cuarentena de snapshots ilegibles. Todo corre con cwd en un
+directorio temporal, así que _DATA_DIR ("data", relativo) y lo que cuelga de
+él (strategic.db, snapshots/) queda fuera del repo.
+"""
+import multiprocessing as mp
+import os
+
+import pandas as pd
+import pytest
+
+import app
+
+N_KPI, SAVES = 8, 10          # procesos que guardan KPIs × guardados cada uno
+N_SNAP, SNAP_ROUNDS = 4, 10   # procesos que escriben y releen el snapshot
+DIGEST = "d" * 64
+
+
+def _raw_export(n: int = 200) -> pd.DataFrame:
+    """Export de Planner mínimo (solo columnas que usa preprocess_data)."""
+    return pd.DataFrame({
+        "Id. de tarea":          [f"T{i}" for i in range(n)],
+        "Nombre de la tarea":    [f"Tarea {i}" for i in range(n)],
+        "Nombre del depósito":   ["Backlog", "Desarrollo"] * (n // 2),
+        "Progreso":              ["Completado", "En curso", "No iniciado", "Completed"] * (n // 4),
+        "Prioridad":             ["Media"] * n,
+        "Asignado a":            ["Ana Ruiz;Luis Mora", "Ana Ruiz"] * (n // 2),
+        "Fecha de creación":     ["01/02/2026"] * n,
+        "Fecha de vencimiento":  ["01/03/2026"] * n,
+        "Con retraso":           [True, False] * (n // 2),
+        "Fecha de finalización": ["15/02/2026", None] * (n // 2),
+        "Etiquetas":             ["🟨 Excelencia ERP;Finanzas", None] * (n // 2),
+    })
+
+
+def _kpi_writer(workdir: str, i: int, q):
+    os.chdir(workdir)
+    sd = {}
+    _, sd["kpis_version"] = app.load_kpis()
+    ok = conflictos = 0
+    for k in range(SAVES):
+        val = i * 1000 + k   # identifica el guardado en las 5 filas del histórico
+        while True:
+            for m, c in app._OBJ_SD_MAP.values():
+                sd[m] = val
+                sd[c] = val
+            try:
+                assert app.save_kpis(sd)
+                ok += 1
+                break
+            except app.KpiVersionConflict:
+                conflictos += 1
+                _, sd["kpis_version"] = app.load_kpis()   # recargar y reintentar
+    q.put(("kpi", ok, conflictos))
+
+
+def _snap_worker(workdir: str, i: int, df: pd.DataFrame, meta: dict, q):
+    os.chdir(workdir)
+    rotas = 0
+    for _ in range(SNAP_ROUNDS):
+        assert app.save_snapshot(DIGEST, df, meta, f"w{i}")
+        leido = app.load_snapshot(DIGEST)
+        rotas += leido is None or len(leido[0]) != len(df)
+    q.put(("snap", rotas, 0))
+
+
+def test_escrituras_concurrentes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    raw = _raw_export()
+    df, meta = app.preprocess_data("e" * 64, raw)
+    meta = {k: v for k, v in meta.items() if k in ("missing_cols", "col_map", "bytes_original")}
+
+    ctx = mp.get_context("spawn")
+    q   = ctx.Queue()
+    ps  = [ctx.Process(target=_kpi_writer, args=(str(tmp_path), i, q)) for i in range(N_KPI)]
+    ps += [ctx.Process(target=_snap_worker, args=(str(tmp_path), i, df, meta, q))
+           for i in range(N_SNAP)]
+    for p in ps:
+        p.start()
+    res = [q.get(timeout=600) for _ in ps]
+    for p in ps:
+        p.join()
+        assert p.exitcode == 0
+
+    guardados = sum(r[1] for r in res if r[0] == "kpi")
+    assert guardados == N_KPI * SAVES
+
+    # Cada guardado exitoso sube la versión exactamente en uno
+    kpis, version = app.load_kpis()
+    assert version == N_KPI * SAVES
+
+    # Las 5 filas de kpis vienen de un mismo guardado
+    assert len({e["meta"] for e in kpis.values()} | {e["avance"] for e in kpis.values()}) == 1
+
+    # Una fila de histórico por objetivo y guardado, contiguas (sin intercalado)
+    hist = app.load_history_df()
+    n_obj = len(app._OBJ_SD_MAP)
+    assert len(hist) == n_obj * guardados
+    bloques = hist["meta"].to_numpy().reshape(-1, n_obj)
+    assert (bloques == bloques[:, :1]).all()
+    assert (hist["meta"] == hist["avance"]).all()
+
+    # Ninguna lectura de snapshot vio un archivo a medio escribir
+    assert sum(r[1] for r in res if r[0] == "snap") == 0
+    assert app.corrupt_snapshots() == []
+    assert not [p for p in os.listdir(app._SNAPSHOT_DIR) if p.endswith(".tmp")]
+
+    # Una sesión con versión vieja no puede pisar lo guardado
+    try:
+        app.save_kpis({"kpis_version": 0})
+    except app.KpiVersionConflict:
+        pass
+    else:
+        raise AssertionError("se aceptó una escritura con versión vieja")
+
+
+def test_load_snapshot_solo_aparta_ilegibles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    df, meta = app.preprocess_data("e" * 64, _raw_export())
+    meta = {k: v for k, v in meta.items() if k in ("missing_cols", "col_map", "bytes_original")}
+    assert app.save_snapshot(DIGEST, df, meta)
+
+    # Falta el Parquet (p. ej. lo expulsó otra sesión): ausente, no corrupto
+    pq = app._SNAPSHOT_DIR / f"{DIGEST}.parquet"
+    contenido = pq.read_bytes()
+    pq.unlink()
+    assert app.load_snapshot(DIGEST) is None
+    assert app.corrupt_snapshots() == []
+
+    # Parquet truncado: se aparta como *.corrupto
+    pq.write_bytes(contenido[: len(contenido) // 2])
+    assert app.load_snapshot(DIGEST) is None
+    assert app.corrupt_snapshots() == [f"{DIGEST}.json.corrupto", f"{DIGEST}.parquet.corrupto"]
+
+
+def test_list_snapshots_tolera_expulsion_concurrente(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    df, meta = app.preprocess_data("e" * 64, _raw_export())
+    meta = {k: v for k, v in meta.items() if k in ("missing_cols", "col_map", "bytes_original")}
+    assert app.save_snapshot(DIGEST, df, meta)
+    assert len(app.list_snapshots()) == 1
+
+    # Otra sesión expulsa el par justo después del glob()
+    glob = type(app._SNAPSHOT_DIR).glob
+
+    def glob_y_expulsar(self, patron):
+        rutas = list(glob(self, patron))
+        for p in rutas:
+            p.unlink()   # expulsión a medias: queda el .parquet sin su .json
+        return iter(rutas)
+
+    monkeypatch.setattr(type(app._SNAPSHOT_DIR), "glob", glob_y_expulsar)
+    assert app.list_snapshots().empty
+
+
+def test_persist_month_solo_absorbe_errores_de_escritura(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    app._month_store.clear()
+    df, meta = app.store_put(DIGEST, *app.preprocess_data(DIGEST, _raw_export()))
+
+    def disco_lleno(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(app, "atomic_write_bytes", disco_lleno)
+    assert app.persist_month("2026-02", df, meta) is False
+
+    # Un defecto (no un error de E/S) no se disfraza de "no se pudo guardar"
+    def defecto(*args, **kwargs):
+        raise TypeError("Object of type Timestamp is not JSON serializable")
+
+    monkeypatch.setattr(app, "atomic_write_bytes", defecto)
+    with pytest.raises(TypeError):
+        app.persist_month("2026-02", df, meta)
+    app._month_store.clear()
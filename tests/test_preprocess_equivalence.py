@@ -0,0 +1,76 @@
+"""
+Las versiones vectorizadas de preprocess_data (normalize_progress_series,
+parse_late_series, extract_strategic_category_series) deben dar exactamente lo
+mismo que las funciones por celda aplicadas con .apply, sobre un corpus
+sintético con acentos, emoji, mayúsculas, espacios, NaN y etiquetas desconocidas.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def parse_late(v):
+    """Función por celda original de preprocess_data (antes de vectorizar)."""
+    if pd.isna(v): return False
+    if isinstance(v, bool): return v
+    return str(v).strip().lower() in ["true", "sí", "si", "yes", "1"]
+
+
+PROGRESO = ["Completado", "completed", " EN CURSO ", "In Progress", "not started",
+            "No iniciado", "NO INICIADO", "Bloqueado", "Completada ✅", "", "  ",
+            "NOT STARTED\n", None, np.nan, pd.NA, 1, 1.0, True]
+RETRASO  = [True, False, np.True_, "true", "TRUE ", "Sí", "SÍ", "SI", "si ", "yes", "Yes",
+            "1", 1, 0, 1.0, 0.0, "no", "", "falso", None, np.nan]
+ETIQUETA = ["🟨 Excelencia ERP", "Integración;🟦 Eficiencia Operativa",
+            "seguridad de la informacion", "SEGURIDAD DE LA INFORMACIÓN", "Seguridad Información",
+            "Datos   Confiables", "datos\nconfiables", "excelencia\terp", "🟥", "integracion; 🟩",
+            "eficiencia operativa 🟨", "INTEGRACIÓN", "EXCELENCIA ERP;datos confiables",
+            "Finanzas", "RRHH;Logística", "🔴 Urgente", "Integr", "", " ", None, np.nan, 5]
+
+
+def _corpus(valores: list, n: int, seed: int, dtype=object) -> pd.Series:
+    r = random.Random(seed)
+    return pd.Series([r.choice(valores) for _ in range(n)], dtype=dtype,
+                     index=pd.RangeIndex(7, 7 + n))   # índice no trivial
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_normalize_progress_equivalente(seed):
+    s = _corpus(PROGRESO, 2000, seed)
+    pd.testing.assert_series_equal(app.normalize_progress_series(s),
+                                   s.apply(app.normalize_progress), check_exact=True)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_parse_late_equivalente(seed):
+    s = _corpus(RETRASO, 2000, seed)
+    pd.testing.assert_series_equal(app.parse_late_series(s), s.apply(parse_late),
+                                   check_exact=True)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_extract_strategic_category_equivalente(seed):
+    s = _corpus(ETIQUETA, 2000, seed)
+    pd.testing.assert_series_equal(app.extract_strategic_category_series(s),
+                                   s.apply(app.extract_strategic_category), check_exact=True)
+
+
+@pytest.mark.parametrize("s", [
+    pd.Series([True, False, True]),
+    pd.Series([1.0, np.nan, 0.0]),
+    pd.Series([np.nan, np.nan]),
+    pd.Series(["Completado", None, "🟨"]),
+    pd.Series(["Completado", None, "🟨"], dtype="string"),
+], ids=["bool", "float", "todo-nan", "object", "string"])
+def test_columnas_tipadas(s):
+    pd.testing.assert_series_equal(app.parse_late_series(s), s.apply(parse_late),
+                                   check_exact=True)
+    pd.testing.assert_series_equal(app.normalize_progress_series(s),
+                                   s.apply(app.normalize_progress), check_exact=True)
+    pd.testing.assert_series_equal(app.extract_strategic_category_series(s),
+                                   s.apply(app.extract_strategic_category),
+                                   check_exact=True)